@@ -1,7 +1,18 @@
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
 
+class HttpTimeouts(BaseModel):
+    """HTTP client timeouts (seconds); unset fields keep their defaults on partial overrides"""
+    default: float = 30.0
+    # LLM health probe: fail fast on connect and pool waits, only the read may take long
+    llm_health_connect: float = 2.0
+    llm_health_read: float = 30.0
+    llm_health_write: float = 5.0
+    llm_health_pool: float = 1.0
+
+
 class Settings(BaseSettings):
     
     # Model provider configuration
@@ -14,6 +25,8 @@ class Settings(BaseSettings):
     model_name: str = "deepseek-chat"
     temperature: float = 0.7
     max_tokens: int = 2000
+    llm_stream: bool = False  # Request streamed (SSE) completions from the custom LLM endpoint
+    citation_strip_regex: bool = False  # Use the legacy regex to strip trailing citations
     
     # MongoDB configuration
     mongodb_uri: str = "mongodb://mongodb:27017"
@@ -67,6 +80,9 @@ class Settings(BaseSettings):
     # MCP configuration
     mcp_config_path: str = "/etc/mcp.json"
     
+    # HTTP client timeouts (seconds), e.g. HTTP_TIMEOUTS='{"llm_health_read": 10}'
+    http_timeouts: HttpTimeouts = HttpTimeouts()
+    
     # Logging configuration
     log_level: str = "INFO"
     
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, model_validator
 from typing import List, Dict, Any, Optional
 from enum import Enum
 import uuid
@@ -6,40 +6,42 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-STATUS_MAP = {
-    "success": "completed",
-    "done": "completed",
-    "finished": "completed",
-    "complete": "completed",
-    "error": "failed",
-    "failure": "failed",
-    "cancelled": "failed",
-    "canceled": "failed",
-    "in_progress": "running",
-    "active": "running",
-    "started": "running",
-    "waiting": "pending",
-    "queued": "pending",
-    "idle": "pending",
-}
-
 class ExecutionStatus(str, Enum):
     PENDING = "pending"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
 
+DONE_STATUSES = frozenset({ExecutionStatus.COMPLETED, ExecutionStatus.FAILED})
+
+STATUS_MAP = {
+    **{status.value: status for status in ExecutionStatus},
+    "success": ExecutionStatus.COMPLETED,
+    "done": ExecutionStatus.COMPLETED,
+    "finished": ExecutionStatus.COMPLETED,
+    "complete": ExecutionStatus.COMPLETED,
+    "error": ExecutionStatus.FAILED,
+    "failure": ExecutionStatus.FAILED,
+    "cancelled": ExecutionStatus.FAILED,
+    "canceled": ExecutionStatus.FAILED,
+    "in_progress": ExecutionStatus.RUNNING,
+    "active": ExecutionStatus.RUNNING,
+    "started": ExecutionStatus.RUNNING,
+    "waiting": ExecutionStatus.PENDING,
+    "queued": ExecutionStatus.PENDING,
+    "idle": ExecutionStatus.PENDING,
+}
+
 def normalize_status(v):
     if isinstance(v, ExecutionStatus):
         return v
     if isinstance(v, str):
-        v_lower = v.lower().strip()
-        try:
-            return ExecutionStatus(v_lower)
-        except ValueError:
-            mapped = STATUS_MAP.get(v_lower, "pending")
-            logger.warning(f"Unknown status '{v}' mapped to '{mapped}'")
-            return ExecutionStatus(mapped)
+        # Exact canonical values are the common case and need no normalization
+        status = STATUS_MAP.get(v) or STATUS_MAP.get(v.strip().lower())
+        if status is None:
+            logger.warning(f"Unknown status '{v}' mapped to '{ExecutionStatus.PENDING.value}'")
+            return ExecutionStatus.PENDING
+        return status
     return ExecutionStatus.PENDING
 
 class Step(BaseModel):
@@ -59,7 +61,7 @@ class Step(BaseModel):
         return normalize_status(v)
 
     def is_done(self) -> bool:
-        return self.status == ExecutionStatus.COMPLETED or self.status == ExecutionStatus.FAILED
+        return self.status in DONE_STATUSES
 
 class Plan(BaseModel):
     model_config = {"extra": "ignore"}
@@ -74,19 +76,27 @@ class Plan(BaseModel):
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
+    # Steps only ever move towards done, so every step before this index is done
+    _next_index: int = PrivateAttr(default=0)
+
     @field_validator("status", mode="before")
     @classmethod
     def validate_status(cls, v):
         return normalize_status(v)
 
     def is_done(self) -> bool:
-        return self.status == ExecutionStatus.COMPLETED or self.status == ExecutionStatus.FAILED
+        return self.status in DONE_STATUSES
+
+    def get_next_step_index(self) -> Optional[int]:
+        index = min(self._next_index, len(self.steps))
+        while index < len(self.steps) and self.steps[index].is_done():
+            index += 1
+        self._next_index = index
+        return index if index < len(self.steps) else None
     
     def get_next_step(self) -> Optional[Step]:
-        for step in self.steps:
-            if not step.is_done():
-                return step
-        return None
+        index = self.get_next_step_index()
+        return self.steps[index] if index is not None else None
     
     def dump_json(self) -> str:
         return self.model_dump_json(include={"goal", "language", "steps"})
@@ -1,6 +1,7 @@
 from typing import Dict, Any, List, AsyncGenerator, Optional
 import json
 import logging
+from pydantic import ValidationError
 from app.domain.models.plan import Plan, Step
 from app.domain.models.message import Message
 from app.domain.services.agents.base import BaseAgent
@@ -29,6 +30,13 @@ from app.domain.utils.json_parser import JsonParser
 
 logger = logging.getLogger(__name__)
 
+def _strip_code_fence(text: str) -> str:
+    """Unwrap a response that is a single markdown code block, e.g. ```json ... ```"""
+    text = text.strip()
+    if text.startswith("```") and text.endswith("```") and "\n" in text:
+        return text[text.index("\n") + 1:-3]
+    return text
+
 class PlannerAgent(BaseAgent):
     """
     Planner agent class, defining the basic behavior of planning
@@ -55,6 +63,16 @@ class PlannerAgent(BaseAgent):
             tools=tools,
         )
 
+    async def _parse_plan(self, text: str) -> Plan:
+        """Decode and validate a plan in one pass, falling back to the repairing JSON parser"""
+        try:
+            return Plan.model_validate_json(_strip_code_fence(text))
+        except ValidationError:
+            pass
+        parsed_response = await self.json_parser.parse(text)
+        if isinstance(parsed_response, str):
+            parsed_response = {"message": parsed_response, "goal": "", "title": "", "steps": []}
+        return Plan.model_validate(parsed_response)
 
     async def create_plan(self, message: Message) -> AsyncGenerator[BaseEvent, None]:
         message = CREATE_PLAN_PROMPT.format(
@@ -65,10 +83,7 @@ class PlannerAgent(BaseAgent):
             if isinstance(event, MessageEvent):
                 logger.info(event.message)
                 try:
-                    parsed_response = await self.json_parser.parse(event.message)
-                    if isinstance(parsed_response, str):
-                        parsed_response = {"message": parsed_response, "goal": "", "title": "", "steps": []}
-                    plan = Plan.model_validate(parsed_response)
+                    plan = await self._parse_plan(event.message)
                 except Exception as e:
                     logger.error(f"Failed to parse plan response: {e}")
                     plan = Plan(
@@ -87,18 +102,13 @@ class PlannerAgent(BaseAgent):
             if isinstance(event, MessageEvent):
                 logger.debug(f"Planner agent update plan: {event.message}")
                 try:
-                    parsed_response = await self.json_parser.parse(event.message)
-                    updated_plan = Plan.model_validate(parsed_response)
-                    new_steps = [Step.model_validate(s) for s in updated_plan.steps]
+                    updated_plan = await self._parse_plan(event.message)
+                    new_steps = updated_plan.steps
                 except Exception as e:
                     logger.error(f"Failed to parse plan update: {e}")
                     new_steps = []
                 
-                first_pending_index = None
-                for i, s in enumerate(plan.steps):
-                    if not s.is_done():
-                        first_pending_index = i
-                        break
+                first_pending_index = plan.get_next_step_index()
                 
                 if first_pending_index is not None:
                     updated_steps = plan.steps[:first_pending_index]
@@ -1,4 +1,5 @@
 import logging
+import asyncio
 from app.domain.services.flows.base import BaseFlow
 from app.domain.models.agent import Agent
 from app.domain.models.message import Message
@@ -104,8 +105,11 @@ class PlanActFlow(BaseFlow):
         
         if session.status != SessionStatus.PENDING:
             logger.debug(f"Session {self._session_id} is not in PENDING status, rolling back")
-            await self.executor.roll_back(message)
-            await self.planner.roll_back(message)
+            # Agents keep separate memories, so both roll backs can run concurrently
+            await asyncio.gather(
+                self.executor.roll_back(message),
+                self.planner.roll_back(message),
+            )
         
         if session.status == SessionStatus.RUNNING:
             logger.debug(f"Session {self._session_id} is in RUNNING status")
@@ -1,19 +1,57 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
 from app.domain.external.llm import LLM
 from app.core.config import get_settings
 import httpx
+import orjson
 import logging
 import asyncio
-import json
 import re
 import random
 
 logger = logging.getLogger(__name__)
 
+TOOLS_PROMPT_CACHE_SIZE = 32
+TOOL_CALL_SUMMARY_CACHE_SIZE = 512
+
+# Exponential backoff before each retry, in seconds
+RETRY_DELAYS = (1.0, 2.0, 4.0)
+
 CITATION_PATTERN = re.compile(r"(\n>\s*\[\d+\]\s*\[.*?\]\(.*?\)\s*)+\s*$", re.DOTALL)
 
 
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+
+
+def _is_citation_line(line: str) -> bool:
+    """Check whether a line looks like `> [1] [title](url)`"""
+    if not line.startswith(">"):
+        return False
+    rest = line[1:].lstrip()
+    if not rest.startswith("["):
+        return False
+    close = rest.find("]")
+    if close <= 1 or not rest[1:close].isdecimal():
+        return False
+    rest = rest[close + 1:].lstrip()
+    return rest.startswith("[") and "](" in rest and rest.endswith(")")
+
+
 class CustomLLM(LLM):
+    # Shared across instances so every request reuses pooled keep-alive connections
+    _client: Optional[httpx.AsyncClient] = None
+
+    # Never mutated, so the same dict is spliced into every JSON-mode request
+    _json_instruction_msg: Dict[str, str] = {
+        "role": "system",
+        "content": (
+            "You MUST respond ONLY with valid JSON. "
+            "Do not include any explanation, markdown formatting, or text outside the JSON object. "
+            "Your entire response must be parseable as JSON."
+        ),
+    }
+
     def __init__(self):
         settings = get_settings()
         self.api_key = settings.api_key
@@ -22,11 +60,47 @@ class CustomLLM(LLM):
         self._temperature = settings.temperature
         self._max_tokens = settings.max_tokens
         self._provider = settings.llm_provider
+        self._citation_strip_regex = settings.citation_strip_regex
+        self._stream = settings.llm_stream
+        # Request parts that never change for this instance
+        self._base_headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+        }
+        self._base_payload = {
+            "model": self._model_name,
+            "temperature": self._temperature,
+            "max_tokens": self._max_tokens,
+            "stream": self._stream,
+        }
+        # Tools system messages keyed by the serialized tool schemas, since agents rebuild the tools list per call
+        self._tools_prompt_cache: Dict[bytes, Dict[str, str]] = {}
+        # Serialized assistant tool calls keyed by id() of the memory's tool_calls list,
+        # which stays the same object across asks; the list is kept to guard against id reuse
+        self._tool_call_summary_cache: "OrderedDict[int, Tuple[List[Dict[str, Any]], str]]" = OrderedDict()
         logger.info(
             f"Initialized Custom LLM with model: {self._model_name}, "
             f"provider: {self._provider}, base: {self.api_base}"
         )
 
+    @classmethod
+    def _get_client(cls) -> httpx.AsyncClient:
+        """Get or create the shared HTTP client"""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(120.0, connect=30.0),
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            )
+        return cls._client
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the shared HTTP client"""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
     @property
     def model_name(self) -> str:
         return self._model_name
@@ -42,7 +116,26 @@ class CustomLLM(LLM):
     def _strip_citations(self, text: str) -> str:
         if not text:
             return text
-        return CITATION_PATTERN.sub("", text).rstrip()
+        if self._citation_strip_regex:
+            return CITATION_PATTERN.sub("", text).rstrip()
+        # Citations only ever trail the answer, so peel them off line by line from the end
+        body = text.rstrip()
+        while True:
+            head, sep, line = body.rpartition("\n")
+            if not sep or not _is_citation_line(line.rstrip()):
+                return body
+            body = head.rstrip()
+
+    def _get_tools_system_message(self, tools: List[Dict[str, Any]]) -> Dict[str, str]:
+        # Key on the full schemas: tools can share names but differ in description or parameters
+        key = orjson.dumps(tools)
+        message = self._tools_prompt_cache.get(key)
+        if message is None:
+            if len(self._tools_prompt_cache) >= TOOLS_PROMPT_CACHE_SIZE:
+                self._tools_prompt_cache.clear()
+            message = self._build_tools_system_message(tools)
+            self._tools_prompt_cache[key] = message
+        return message
 
     def _build_tools_system_message(self, tools: List[Dict[str, Any]]) -> Dict[str, str]:
         lines = [
@@ -82,43 +175,55 @@ class CustomLLM(LLM):
 
         return {"role": "system", "content": "\n".join(lines)}
 
+    def _summarize_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> str:
+        cached = self._tool_call_summary_cache.get(id(tool_calls))
+        if cached is not None and cached[0] is tool_calls:
+            self._tool_call_summary_cache.move_to_end(id(tool_calls))
+            return cached[1]
+
+        summary = "\n".join(
+            _dumps({
+                "tool_calls": [{
+                    "function": {
+                        "name": tc.get("function", {}).get("name", ""),
+                        "arguments": tc.get("function", {}).get("arguments", "{}")
+                    }
+                }]
+            })
+            for tc in tool_calls
+        )
+        self._tool_call_summary_cache[id(tool_calls)] = (tool_calls, summary)
+        if len(self._tool_call_summary_cache) > TOOL_CALL_SUMMARY_CACHE_SIZE:
+            self._tool_call_summary_cache.popitem(last=False)
+        return summary
+
     def _convert_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-        converted = []
-        for msg in messages:
+        # Conversion is one-to-one, so fill preallocated slots instead of growing the list
+        converted: List[Optional[Dict[str, str]]] = [None] * len(messages)
+        for i, msg in enumerate(messages):
             role = msg.get("role", "user")
             content = msg.get("content", "")
 
             if role == "tool":
                 tool_call_id = msg.get("tool_call_id", "unknown")
                 tool_name = msg.get("function_name") or msg.get("name") or "tool"
-                converted.append({
+                converted[i] = {
                     "role": "user",
                     "content": f"[Tool Result for {tool_name} (call_id: {tool_call_id})]: {content}"
-                })
+                }
             elif role == "assistant" and msg.get("tool_calls"):
-                tc_summary = []
-                for tc in msg["tool_calls"]:
-                    fn = tc.get("function", {})
-                    tc_obj = {
-                        "tool_calls": [{
-                            "function": {
-                                "name": fn.get("name", ""),
-                                "arguments": fn.get("arguments", "{}")
-                            }
-                        }]
-                    }
-                    tc_summary.append(json.dumps(tc_obj))
-                converted.append({
+                tc_summary = self._summarize_tool_calls(msg["tool_calls"])
+                converted[i] = {
                     "role": "assistant",
-                    "content": "\n".join(tc_summary) if tc_summary else (content or "")
-                })
+                    "content": tc_summary or content or ""
+                }
             else:
                 if role not in ("system", "user", "assistant"):
                     role = "user"
-                converted.append({
+                converted[i] = {
                     "role": role,
                     "content": content or ""
-                })
+                }
         return converted
 
     def _should_force_tool_use(self, messages: List[Dict[str, Any]], response_content: str) -> bool:
@@ -130,35 +235,36 @@ class CustomLLM(LLM):
         if has_tool_results:
             return False
         try:
-            data = json.loads(response_content.strip())
+            data = orjson.loads(response_content)
             if isinstance(data, dict) and ("success" in data or "result" in data):
                 return True
-        except (json.JSONDecodeError, TypeError):
+        except (orjson.JSONDecodeError, TypeError):
             pass
         return False
 
     def _parse_tool_calls(self, text: str) -> Optional[List[Dict[str, Any]]]:
-        if not text:
+        # Plain answers never mention the key, so skip parsing them entirely
+        if not text or '"tool_calls"' not in text:
             return None
         try:
-            stripped = text.strip()
-            json_start = stripped.find("{")
-            json_end = stripped.rfind("}") + 1
-            if json_start == -1 or json_end == 0:
-                return None
-
-            json_str = stripped[json_start:json_end]
-            data = json.loads(json_str)
-
-            if "tool_calls" in data:
+            try:
+                data = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                json_start = text.find("{")
+                json_end = text.rfind("}") + 1
+                if json_start == -1 or json_end == 0:
+                    return None
+                data = orjson.loads(text[json_start:json_end])
+
+            if isinstance(data, dict) and "tool_calls" in data:
                 tool_calls = []
                 for i, tc in enumerate(data["tool_calls"]):
                     func = tc.get("function", {})
                     arguments = func.get("arguments", {})
                     if isinstance(arguments, dict):
-                        arguments = json.dumps(arguments)
+                        arguments = _dumps(arguments)
                     elif not isinstance(arguments, str):
-                        arguments = json.dumps(arguments)
+                        arguments = _dumps(arguments)
                     tool_calls.append({
                         "id": f"call_{i}",
                         "type": "function",
@@ -168,10 +274,76 @@ class CustomLLM(LLM):
                         }
                     })
                 return tool_calls if tool_calls else None
-        except (json.JSONDecodeError, KeyError, TypeError):
+        except (orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
             pass
         return None
 
+    def _extract_content(self, response_data: Any) -> str:
+        """Pull the assistant text out of a completion payload, tolerating non-OpenAI shapes"""
+        content = ""
+        if isinstance(response_data, dict):
+            choices = response_data.get("choices", [])
+            if choices:
+                message = choices[0].get("message", {})
+                content = message.get("content", "")
+            else:
+                content = (
+                    response_data.get("data")
+                    or response_data.get("response")
+                    or response_data.get("text")
+                    or response_data.get("content")
+                    or _dumps(response_data)
+                )
+        elif isinstance(response_data, str):
+            content = response_data
+
+        if isinstance(content, dict):
+            content = content.get("content", _dumps(content))
+
+        return self._strip_citations(content)
+
+    async def _post_completion(
+        self,
+        client: httpx.AsyncClient,
+        body: bytes,
+        headers: Dict[str, str],
+    ) -> Tuple[int, Any]:
+        """Send a chat completion request and return the status code with the decoded body.
+
+        Event-stream responses are decoded chunk by chunk as they arrive and folded back
+        into a regular completion payload. On a non-200 status the raw error text is returned.
+        """
+        async with client.stream(
+            "POST",
+            f"{self.api_base}/v1/chat/completions",
+            content=body,
+            headers=headers,
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response.status_code, response.text
+
+            if not response.headers.get("content-type", "").startswith("text/event-stream"):
+                return response.status_code, orjson.loads(await response.aread())
+
+            parts = []
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = orjson.loads(data)
+                if isinstance(chunk, dict) and chunk.get("error"):
+                    # A mid-stream error means the completion is truncated; let the caller retry
+                    raise ValueError(f"Custom API stream error: {_dumps(chunk['error'])[:500]}")
+                choices = chunk.get("choices") if isinstance(chunk, dict) else None
+                if choices:
+                    delta = choices[0].get("delta") or choices[0].get("message") or {}
+                    if delta.get("content"):
+                        parts.append(delta["content"])
+            return response.status_code, {"choices": [{"message": {"content": "".join(parts)}}]}
+
     async def ask(
         self,
         messages: List[Dict[str, str]],
@@ -179,83 +351,52 @@ class CustomLLM(LLM):
         response_format: Optional[Dict[str, Any]] = None,
         tool_choice: Optional[str] = None,
     ) -> Dict[str, Any]:
-        max_retries = 3
-        base_delay = 1.0
-        connection_timeout = 30.0
-        request_timeout = 120.0
+        max_retries = len(RETRY_DELAYS)
+        client = self._get_client()
 
         api_messages = self._convert_messages(messages)
 
+        extra_system_messages = []
         if tools:
-            tools_msg = self._build_tools_system_message(tools)
-            insert_idx = 0
-            for i, m in enumerate(api_messages):
-                if m["role"] == "system":
-                    insert_idx = i + 1
-                else:
-                    break
-            api_messages.insert(insert_idx, tools_msg)
-
-        if response_format and response_format.get("type") == "json_object" and not tools:
-            json_instruction = {
-                "role": "system",
-                "content": (
-                    "You MUST respond ONLY with valid JSON. "
-                    "Do not include any explanation, markdown formatting, or text outside the JSON object. "
-                    "Your entire response must be parseable as JSON."
-                ),
-            }
-            insert_idx = 0
-            for i, m in enumerate(api_messages):
-                if m["role"] == "system":
-                    insert_idx = i + 1
-                else:
-                    break
-            api_messages.insert(insert_idx, json_instruction)
+            extra_system_messages.append(self._get_tools_system_message(tools))
+        elif response_format and response_format.get("type") == "json_object":
+            extra_system_messages.append(self._json_instruction_msg)
 
-        payload = {
-            "model": self._model_name,
-            "messages": api_messages,
-            "temperature": self._temperature,
-            "max_tokens": self._max_tokens,
-        }
+        if extra_system_messages:
+            # Place them right after the leading system messages, in one scan and one splice
+            insert_idx = next(
+                (i for i, m in enumerate(api_messages) if m["role"] != "system"),
+                len(api_messages),
+            )
+            api_messages[insert_idx:insert_idx] = extra_system_messages
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}",
-        }
+        payload = {**self._base_payload, "messages": api_messages}
+        headers = self._base_headers
+
+        body = orjson.dumps(payload)
 
         for attempt in range(max_retries + 1):
             try:
                 if attempt > 0:
-                    delay = base_delay * (2 ** (attempt - 1))
-                    jitter = random.uniform(0, delay * 0.1)
-                    delay += jitter
+                    delay = RETRY_DELAYS[attempt - 1]
+                    delay += random.uniform(0, delay * 0.1)
                     logger.info(
-                        f"Retrying Custom API request (attempt {attempt + 1}/{max_retries + 1}) "
-                        f"after {delay:.2f}s delay"
+                        "Retrying Custom API request (attempt %d/%d) after %.2fs delay",
+                        attempt + 1, max_retries + 1, delay
                     )
                     await asyncio.sleep(delay)
 
                 logger.debug(
-                    f"Sending request to Custom API: {self.api_base}/v1/chat/completions "
-                    f"with model={self._model_name}"
+                    "Sending request to Custom API: %s/v1/chat/completions with model=%s",
+                    self.api_base, self._model_name
                 )
 
-                timeout_config = httpx.Timeout(
-                    timeout=request_timeout, connect=connection_timeout
-                )
-                async with httpx.AsyncClient(timeout=timeout_config) as client:
-                    response = await client.post(
-                        f"{self.api_base}/v1/chat/completions",
-                        json=payload,
-                        headers=headers,
-                    )
+                status_code, response_data = await self._post_completion(client, body, headers)
 
-                if response.status_code != 200:
+                if status_code != 200:
                     error_msg = (
-                        f"Custom API returned status {response.status_code} on attempt "
-                        f"{attempt + 1}: {response.text[:500]}"
+                        f"Custom API returned status {status_code} on attempt "
+                        f"{attempt + 1}: {response_data[:500]}"
                     )
                     logger.error(error_msg)
                     if attempt == max_retries:
@@ -264,32 +405,9 @@ class CustomLLM(LLM):
                         )
                     continue
 
-                response_data = response.json()
-                logger.debug(
-                    f"Response from Custom API (attempt {attempt + 1}): status=200"
-                )
-
-                content = ""
-                if isinstance(response_data, dict):
-                    choices = response_data.get("choices", [])
-                    if choices:
-                        message = choices[0].get("message", {})
-                        content = message.get("content", "")
-                    else:
-                        content = (
-                            response_data.get("data")
-                            or response_data.get("response")
-                            or response_data.get("text")
-                            or response_data.get("content")
-                            or json.dumps(response_data)
-                        )
-                elif isinstance(response_data, str):
-                    content = response_data
-
-                if isinstance(content, dict):
-                    content = content.get("content", json.dumps(content))
+                logger.debug("Response from Custom API (attempt %d): status=200", attempt + 1)
 
-                content = self._strip_citations(content)
+                content = self._extract_content(response_data)
 
                 result: Dict[str, Any] = {
                     "role": "assistant",
@@ -316,27 +434,20 @@ class CustomLLM(LLM):
                         api_messages.append({"role": "assistant", "content": content})
                         api_messages.append(force_msg)
                         payload["messages"] = api_messages
-                        
-                        async with httpx.AsyncClient(timeout=timeout_config) as client2:
-                            response2 = await client2.post(
-                                f"{self.api_base}/v1/chat/completions",
-                                json=payload,
-                                headers=headers,
-                            )
-                        if response2.status_code == 200:
-                            resp2_data = response2.json()
-                            choices2 = resp2_data.get("choices", [])
-                            if choices2:
-                                content2 = choices2[0].get("message", {}).get("content", "")
-                                content2 = self._strip_citations(content2)
-                                tool_calls2 = self._parse_tool_calls(content2)
-                                if tool_calls2:
-                                    result["tool_calls"] = tool_calls2
-                                    result["content"] = None
-                                    logger.info("Successfully forced tool call on retry")
-                                else:
-                                    logger.warning("LLM still didn't use tools after retry")
-                                    result["content"] = content2 or content
+
+                        status_code2, resp2_data = await self._post_completion(
+                            client, orjson.dumps(payload), headers
+                        )
+                        if status_code2 == 200:
+                            content2 = self._extract_content(resp2_data)
+                            tool_calls2 = self._parse_tool_calls(content2)
+                            if tool_calls2:
+                                result["tool_calls"] = tool_calls2
+                                result["content"] = None
+                                logger.info("Successfully forced tool call on retry")
+                            else:
+                                logger.warning("LLM still didn't use tools after retry")
+                                result["content"] = content2 or content
 
                 return result
 
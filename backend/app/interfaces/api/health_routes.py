@@ -1,7 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Response
 from app.interfaces.schemas.base import APIResponse
 from app.core.config import get_settings
+from functools import lru_cache
 import httpx
+import orjson
 import logging
 import time
 
@@ -10,10 +12,11 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/health", tags=["health"])
 
 
-@router.get("", response_model=APIResponse)
-async def health_check():
+@lru_cache(maxsize=1)
+def _build_health_payload() -> dict:
+    """Build the health status once; settings are cached for the process lifetime"""
     settings = get_settings()
-    status = {
+    return {
         "status": "ok",
         "llm_type": settings.llm_type,
         "llm_provider": settings.llm_provider,
@@ -21,43 +24,74 @@ async def health_check():
         "api_base": settings.api_base[:50] + "..." if len(settings.api_base) > 50 else settings.api_base,
         "has_api_key": bool(settings.api_key),
     }
-    return APIResponse.success(data=status)
 
 
-@router.get("/llm", response_model=APIResponse)
-async def llm_health_check():
+@lru_cache(maxsize=1)
+def _build_health_json() -> bytes:
+    """Serialize the constant health response once"""
+    return APIResponse.success(data=_build_health_payload()).model_dump_json().encode()
+
+
+@router.get("")
+async def health_check():
+    return Response(content=_build_health_json(), media_type="application/json")
+
+
+@lru_cache(maxsize=1)
+def _build_llm_static_payload() -> dict:
+    """Invariant part of a successful LLM health response"""
+    settings = get_settings()
+    return {
+        "status": "connected",
+        "provider": settings.llm_provider,
+        "model": settings.model_name,
+    }
+
+
+@lru_cache(maxsize=1)
+def _build_llm_probe_body() -> bytes:
+    """Serialize the LLM probe request body once"""
+    settings = get_settings()
+    return orjson.dumps({
+        "text": "Hello, respond with just 'OK' in one word.",
+        "provider": settings.llm_provider,
+        "model": settings.model_name
+    })
+
+
+@router.get("/llm")
+async def llm_health_check(request: Request):
     settings = get_settings()
     start_time = time.time()
 
     try:
         if settings.llm_type == "custom":
             api_base = settings.api_base.rstrip("/")
-            payload = {
-                "text": "Hello, respond with just 'OK' in one word.",
-                "provider": settings.llm_provider,
-                "model": settings.model_name
-            }
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {settings.api_key}"
             }
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{api_base}/api/chat",
-                    json=payload,
-                    headers=headers
-                )
+            client: httpx.AsyncClient = request.app.state.http_client
+            response = await client.post(
+                f"{api_base}/api/chat",
+                content=_build_llm_probe_body(),
+                headers=headers,
+                timeout=httpx.Timeout(
+                    connect=settings.http_timeouts.llm_health_connect,
+                    read=settings.http_timeouts.llm_health_read,
+                    write=settings.http_timeouts.llm_health_write,
+                    pool=settings.http_timeouts.llm_health_pool,
+                ),
+            )
 
             elapsed = round(time.time() - start_time, 2)
 
             if response.status_code == 200:
                 return APIResponse.success(data={
-                    "status": "connected",
-                    "provider": settings.llm_provider,
-                    "model": settings.model_name,
+                    **_build_llm_static_payload(),
                     "response_time_seconds": elapsed,
-                    "response_preview": str(response.text)[:200]
+                    "response_preview": response.text[:200]
                 })
             else:
                 return APIResponse.error(
@@ -3,11 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 import asyncio
+import httpx
 
 from app.core.config import get_settings
 from app.infrastructure.storage.mongodb import get_mongodb
 from app.infrastructure.storage.redis import get_redis
 from app.interfaces.dependencies import get_agent_service
+from app.infrastructure.external.llm.custom_llm import CustomLLM
 from app.interfaces.api.routes import router
 from app.infrastructure.logging import setup_logging
 from app.interfaces.errors.exception_handlers import register_exception_handlers
@@ -40,6 +42,12 @@ async def lifespan(app: FastAPI):
     
     # Initialize Redis
     await get_redis().initialize()
+
+    # Shared HTTP client for outbound calls made by API routes
+    app.state.http_client = httpx.AsyncClient(
+        timeout=settings.http_timeouts.default,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
     
     try:
         yield
@@ -61,6 +69,10 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"Error during AgentService cleanup: {str(e)}")
 
+        # Close the shared HTTP clients
+        await app.state.http_client.aclose()
+        await CustomLLM.aclose()
+
 app = FastAPI(title="Manus AI Agent", lifespan=lifespan)
 
 # Configure CORS
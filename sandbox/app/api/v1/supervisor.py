@@ -3,7 +3,8 @@ from pydantic import BaseModel
 from typing import Optional
 
 from app.schemas.response import Response
-from app.services.supervisor import supervisor_service
+# Resolved through the module so the service is created lazily, not at import time
+from app.services import supervisor as supervisor_module
 
 
 # Request model
@@ -18,7 +19,7 @@ async def get_status():
     """
     Get status of all services
     """
-    processes = await supervisor_service.get_all_processes()
+    processes = await supervisor_module.supervisor_service.get_all_processes()
     return Response(
         success=True,
         message="Services status retrieved successfully",
@@ -30,7 +31,7 @@ async def stop_services():
     """
     Stop all services
     """
-    result = await supervisor_service.stop_all_services()
+    result = await supervisor_module.supervisor_service.stop_all_services()
     return Response(
         success=True,
         message="All services stopped",
@@ -42,7 +43,7 @@ async def shutdown_supervisor():
     """
     Shutdown only the supervisord service itself
     """
-    result = await supervisor_service.shutdown()
+    result = await supervisor_module.supervisor_service.shutdown()
     return Response(
         success=True,
         message="Supervisord service shutdown",
@@ -54,7 +55,7 @@ async def restart_services():
     """
     Restart all services
     """
-    result = await supervisor_service.restart_all_services()
+    result = await supervisor_module.supervisor_service.restart_all_services()
     return Response(
         success=True,
         message="All services restarted",
@@ -68,9 +69,9 @@ async def activate_timeout(request: TimeoutRequest):
     
     minutes: Optional, timeout duration (minutes), if not provided, system default configuration will be used
     """
-    result = await supervisor_service.activate_timeout(request.minutes)
+    result = await supervisor_module.supervisor_service.activate_timeout(request.minutes)
     # Disable auto-expand since user explicitly controls timeout
-    supervisor_service.disable_auto_expand()
+    supervisor_module.supervisor_service.disable_auto_expand()
     return Response(
         success=True,
         message=f"Timeout reset, all services will be shut down after {result.timeout_minutes} minutes",
@@ -84,9 +85,9 @@ async def extend_timeout(request: TimeoutRequest):
     
     minutes: Optional, number of minutes to extend, if not provided, system default configuration will be used
     """
-    result = await supervisor_service.extend_timeout(request.minutes)
+    result = await supervisor_module.supervisor_service.extend_timeout(request.minutes)
     # Disable auto-expand since user explicitly controls timeout
-    supervisor_service.disable_auto_expand()
+    supervisor_module.supervisor_service.disable_auto_expand()
     return Response(
         success=True,
         message=f"Timeout extended, all services will be shut down after {result.timeout_minutes} minutes",
@@ -98,7 +99,7 @@ async def cancel_timeout():
     """
     Cancel timeout feature
     """
-    result = await supervisor_service.cancel_timeout()
+    result = await supervisor_module.supervisor_service.cancel_timeout()
     return Response(
         success=True,
         message="Timeout cancelled" if result.status == "timeout_cancelled" else "No active timeout",
@@ -110,7 +111,7 @@ async def get_timeout_status():
     """
     Get timeout status
     """
-    result = await supervisor_service.get_timeout_status()
+    result = await supervisor_module.supervisor_service.get_timeout_status()
     message = "No active timeout" if not result.active else f"Remaining time: {result.remaining_seconds // 60} minutes"
     return Response(
         success=True,
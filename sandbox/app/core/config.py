@@ -9,6 +9,9 @@ class Settings(BaseSettings):
     # Service timeout settings (minutes)
     SERVICE_TIMEOUT_MINUTES: Optional[int] = None
     
+    # Upper bound for a single supervisord RPC call (seconds)
+    RPC_TIMEOUT_SECONDS: float = 30.0
+    
     # Log configuration
     LOG_LEVEL: str = "INFO"
     
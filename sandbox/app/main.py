@@ -1,4 +1,6 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -15,6 +17,7 @@ from app.core.exceptions import (
     general_exception_handler
 )
 from app.core.middleware import auto_extend_timeout_middleware
+from app.services.supervisor import get_supervisor_service, close_supervisor_service
 
 # Configure logging
 def setup_logging():
@@ -46,8 +49,20 @@ def setup_logging():
 setup_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connecting to supervisord blocks, so build the service off the event loop before serving traffic
+    supervisor = await asyncio.to_thread(get_supervisor_service)
+    supervisor.start_timer()
+    try:
+        yield
+    finally:
+        # Close the supervisor RPC connection
+        close_supervisor_service()
+
 app = FastAPI(
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Set up CORS
@@ -1,10 +1,13 @@
-import threading
 import xmlrpc.client
 import socket
+import os
+import stat
 import http.client
 import asyncio
+import functools
+import time
 from datetime import datetime, timedelta
-from typing import List
+from typing import Callable, List, Optional, Tuple
 
 from app.core.config import settings
 from app.core.exceptions import BadRequestException, ResourceNotFoundException
@@ -15,6 +18,13 @@ from app.models.supervisor import (
 )
 
 
+# How long a process listing is reused before supervisord is asked again (seconds)
+PROCESS_CACHE_TTL_SECONDS = 0.5
+
+# Upper bound for the startup probe, so a stuck supervisord cannot hang startup (seconds)
+RPC_CONNECT_TIMEOUT_SECONDS = 5.0
+
+
 # Add Unix socket support for xmlrpc client
 class UnixStreamHTTPConnection(http.client.HTTPConnection):
     def __init__(self, host, socket_path, timeout=None):
@@ -23,16 +33,131 @@ class UnixStreamHTTPConnection(http.client.HTTPConnection):
 
     def connect(self):
         self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
         self.sock.connect(self.socket_path)
 
 
 class UnixStreamTransport(xmlrpc.client.Transport):
-    def __init__(self, socket_path):
+    def __init__(self, socket_path, timeout=None):
         xmlrpc.client.Transport.__init__(self)
         self.socket_path = socket_path
+        self.timeout = timeout
 
     def make_connection(self, host):
-        return UnixStreamHTTPConnection(host, self.socket_path)
+        return UnixStreamHTTPConnection(host, self.socket_path, timeout=self.timeout)
+
+
+class AsyncUnixXmlrpc:
+    """
+    Minimal XML-RPC client over a Unix socket that runs natively on the event loop.
+    Keeps one HTTP/1.1 keep-alive connection open; calls are serialized on it.
+    """
+    def __init__(self, socket_path: str, path: str = "/RPC2"):
+        self.socket_path = socket_path
+        self.path = path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def call(self, method: str, *args):
+        """Invoke an XML-RPC method and return its unmarshalled result"""
+        body = xmlrpc.client.dumps(args, method).encode()
+        request = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            "Host: localhost\r\n"
+            "Content-Type: text/xml\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n"
+        ).encode() + body
+        async with self._lock:
+            # Only a reused connection may have been dropped while idle, so retry at most once
+            attempts = 2 if self._writer is not None else 1
+            for attempt in range(attempts):
+                try:
+                    data = await self._roundtrip(request)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    self.close()
+                    if attempt == attempts - 1:
+                        raise
+                except BaseException:
+                    # Connection state is unknown after a failure or cancellation
+                    self.close()
+                    raise
+        return xmlrpc.client.loads(data)[0][0]
+
+    async def _roundtrip(self, request: bytes) -> bytes:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        self._writer.write(request)
+        await self._writer.drain()
+        return await self._read_response()
+
+    async def _read_response(self) -> bytes:
+        reader = self._reader
+        status_line = await reader.readuntil(b"\r\n")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2:
+            raise ConnectionError(f"Malformed status line: {status_line!r}")
+        status = int(parts[1])
+        headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b"".join(chunks)
+        else:
+            data = await reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        if status != 200:
+            reason = parts[2].decode("latin-1").strip() if len(parts) > 2 else ""
+            raise xmlrpc.client.ProtocolError(self.socket_path + self.path, status, reason, headers)
+        return data
+
+    def close(self):
+        """Drop the connection; the next call reconnects"""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+
+def _rpc_guarded(default_factory: Callable[[], object]):
+    """
+    Return default_factory() instead of calling supervisord when it is not available,
+    and instead of raising when the RPC call fails
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if not self._connected or self.server is None:
+                return default_factory()
+            try:
+                return await func(self, *args, **kwargs)
+            except Exception:
+                return default_factory()
+        return wrapper
+    return decorator
 
 
 class SupervisorService:
@@ -44,21 +169,32 @@ class SupervisorService:
         self.rpc_url = "/tmp/supervisor.sock"
         self._connected = False
         self.server = None
+        # Short-lived process listing shared by concurrent pollers
+        self._procs_cache: Optional[Tuple[float, List[ProcessInfo]]] = None
+        self._procs_lock = asyncio.Lock()
         
         # Try to connect to supervisord, but don't fail if it's not available
         self._connect_rpc()
         
         # Timeout management - enabled based on configuration
         self.timeout_active = settings.SERVICE_TIMEOUT_MINUTES is not None
-        self.shutdown_task = None
+        self.shutdown_handle: Optional[asyncio.TimerHandle] = None
+        self._shutdown_future: Optional[asyncio.Future] = None
         self.shutdown_time = None
+        # Monotonic deadline backing remaining-time checks; shutdown_time is kept for display
+        self._shutdown_monotonic: Optional[float] = None
         # Auto-expand functionality - disabled when user explicitly controls timeout
         self._auto_expand_enabled = True
         
-        # If timeout is configured, create scheduled task
+        # If timeout is configured, set the deadline and arm it once an event loop is available
         if settings.SERVICE_TIMEOUT_MINUTES is not None:
             self.shutdown_time = datetime.now() + timedelta(minutes=settings.SERVICE_TIMEOUT_MINUTES)
-            self._setup_timer(settings.SERVICE_TIMEOUT_MINUTES)
+            self._shutdown_monotonic = time.monotonic() + settings.SERVICE_TIMEOUT_MINUTES * 60
+            try:
+                self.start_timer()
+            except RuntimeError:
+                # Created off-loop (e.g. in a worker thread at startup); the app startup hook arms it
+                pass
     
     @property
     def auto_expand_enabled(self) -> bool:
@@ -75,13 +211,25 @@ class SupervisorService:
     
     def _connect_rpc(self):
         """Connect to supervisord's RPC interface. Gracefully handles failures."""
+        # Skip the RPC round-trip entirely when there is no socket to talk to
+        try:
+            socket_present = stat.S_ISSOCK(os.stat(self.rpc_url).st_mode)
+        except OSError:
+            socket_present = False
+        if not socket_present:
+            self._connected = False
+            self.server = None
+            return
+        
         try:
-            self.server = xmlrpc.client.ServerProxy(
+            # Test connection with a bounded probe; regular calls may legitimately take longer
+            probe = xmlrpc.client.ServerProxy(
                 'http://localhost',
-                transport=UnixStreamTransport(self.rpc_url)
+                transport=UnixStreamTransport(self.rpc_url, timeout=RPC_CONNECT_TIMEOUT_SECONDS)
             )
-            # Test connection
-            self.server.supervisor.getState()
+            probe.supervisor.getState()
+            # Regular calls run on the event loop; it connects lazily on first use
+            self.server = AsyncUnixXmlrpc(self.rpc_url)
             self._connected = True
         except Exception as e:
             # Connection failed - supervisord is not available
@@ -90,98 +238,87 @@ class SupervisorService:
             self.server = None
     
     def _setup_timer(self, minutes):
-        """Set up async timer"""
-        # Cancel existing scheduled task
-        if self.shutdown_task:
-            try:
-                self.shutdown_task.cancel()
-            except:
-                pass
-            
-        # Create scheduled task function
-        async def shutdown_after_timeout():
-            await asyncio.sleep(minutes * 60)
-            await self.shutdown()
+        """Schedule shutdown on the running event loop, replacing any pending one"""
+        self._shutdown_monotonic = time.monotonic() + minutes * 60
         
-        # Create scheduled task
-        try:
-            loop = asyncio.get_event_loop()
-            self.shutdown_task = loop.create_task(shutdown_after_timeout())
-        except Exception as e:
-            # If async task creation fails, fall back to thread timer
-            if hasattr(self, 'shutdown_timer') and self.shutdown_timer:
-                self.shutdown_timer.cancel()
-            
-            self.shutdown_timer = threading.Timer(
-                minutes * 60, 
-                lambda: asyncio.run(self.shutdown())
-            )
-            self.shutdown_timer.daemon = True
-            self.shutdown_timer.start()
+        if self.shutdown_handle:
+            self.shutdown_handle.cancel()
+        
+        loop = asyncio.get_running_loop()
+        self.shutdown_handle = loop.call_later(minutes * 60, self._on_timeout)
     
-    async def _call_rpc(self, method, *args):
+    def start_timer(self):
+        """Arm the pending timeout on the running event loop if it is not scheduled yet"""
+        if not self.timeout_active or self.shutdown_handle or self._shutdown_monotonic is None:
+            return
+        remaining = max(0.0, self._shutdown_monotonic - time.monotonic())
+        self.shutdown_handle = asyncio.get_running_loop().call_later(remaining, self._on_timeout)
+    
+    def _on_timeout(self):
+        """Timer callback; keeps a reference so the shutdown task is not garbage collected"""
+        self.shutdown_handle = None
+        self._shutdown_future = asyncio.ensure_future(self.shutdown())
+    
+    async def _call_rpc(self, method: str, *args):
         """Execute RPC call asynchronously"""
         try:
-            return await asyncio.to_thread(method, *args)
+            # Bound each call so a hung supervisord cannot wedge the caller
+            return await asyncio.wait_for(self.server.call(method, *args), timeout=settings.RPC_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise BadRequestException("RPC call timed out")
         except Exception as e:
             raise BadRequestException(f"RPC call failed: {str(e)}")
     
+    def close(self):
+        """Close the RPC connection"""
+        if self.server is not None:
+            self.server.close()
+    
+    @_rpc_guarded(list)
     async def get_all_processes(self) -> List[ProcessInfo]:
         """Asynchronously get all process statuses"""
-        if not self._connected or self.server is None:
-            # Return empty list when supervisord is not available
-            return []
+        if self._procs_cache and time.monotonic() - self._procs_cache[0] < PROCESS_CACHE_TTL_SECONDS:
+            return self._procs_cache[1]
         
-        try:
-            processes = await self._call_rpc(self.server.supervisor.getAllProcessInfo)
-            return [ProcessInfo(**process) for process in processes]
-        except Exception as e:
-            # If call fails, return empty list instead of raising error
-            return []
+        # Single flight: concurrent callers wait for one RPC instead of issuing their own
+        async with self._procs_lock:
+            if self._procs_cache and time.monotonic() - self._procs_cache[0] < PROCESS_CACHE_TTL_SECONDS:
+                return self._procs_cache[1]
+            processes = await self._call_rpc("supervisor.getAllProcessInfo")
+            # supervisord's process info already matches the schema, so skip validation
+            result = [ProcessInfo.model_construct(**process) for process in processes]
+            self._procs_cache = (time.monotonic(), result)
+            return result
     
+    @_rpc_guarded(lambda: SupervisorActionResult(status="stopped", result=[]))
     async def stop_all_services(self) -> SupervisorActionResult:
         """Asynchronously stop all services"""
-        if not self._connected or self.server is None:
-            # Return a mock result when supervisord is not available
-            return SupervisorActionResult(status="stopped", result=[])
-        
-        try:
-            result = await self._call_rpc(self.server.supervisor.stopAllProcesses)
-            return SupervisorActionResult(status="stopped", result=result)
-        except Exception as e:
-            # Return a mock result instead of raising error
-            return SupervisorActionResult(status="stopped", result=[])
+        result = await self._call_rpc("supervisor.stopAllProcesses")
+        self._procs_cache = None
+        return SupervisorActionResult(status="stopped", result=result)
     
+    @_rpc_guarded(lambda: SupervisorActionResult(status="shutdown", shutdown_result=[]))
     async def shutdown(self) -> SupervisorActionResult:
         """Asynchronously shut down the supervisord service itself, without stopping processes"""
-        if not self._connected or self.server is None:
-            # Return a mock result when supervisord is not available
-            return SupervisorActionResult(status="shutdown", shutdown_result=[])
-        
-        try:
-            shutdown_result = await self._call_rpc(self.server.supervisor.shutdown)
-            return SupervisorActionResult(status="shutdown", shutdown_result=shutdown_result)
-        except Exception as e:
-            # Return a mock result instead of raising error
-            return SupervisorActionResult(status="shutdown", shutdown_result=[])
+        shutdown_result = await self._call_rpc("supervisor.shutdown")
+        self._procs_cache = None
+        return SupervisorActionResult(status="shutdown", shutdown_result=shutdown_result)
     
+    @_rpc_guarded(lambda: SupervisorActionResult(status="restarted", stop_result=[], start_result=[]))
     async def restart_all_services(self) -> SupervisorActionResult:
         """Asynchronously restart all services"""
-        if not self._connected or self.server is None:
-            # Return a mock result when supervisord is not available
-            return SupervisorActionResult(status="restarted", stop_result=[], start_result=[])
-        
-        try:
-            stop_result = await self._call_rpc(self.server.supervisor.stopAllProcesses)
-            start_result = await self._call_rpc(self.server.supervisor.startAllProcesses)
-            return SupervisorActionResult(
-                status="restarted", 
-                stop_result=stop_result,
-                start_result=start_result
-            )
-        except Exception as e:
-            # Return a mock result instead of raising error
-            return SupervisorActionResult(status="restarted", stop_result=[], start_result=[])
+        # Send stop and start as one system.multicall request
+        results = await self._call_rpc("system.multicall", [
+            {"methodName": "supervisor.stopAllProcesses", "params": []},
+            {"methodName": "supervisor.startAllProcesses", "params": []},
+        ])
+        stop_result, start_result = list(xmlrpc.client.MultiCallIterator(results))
+        self._procs_cache = None
+        return SupervisorActionResult(
+            status="restarted", 
+            stop_result=stop_result,
+            start_result=start_result
+        )
     
     async def activate_timeout(self, minutes=None) -> SupervisorTimeout:
         """
@@ -242,20 +379,13 @@ class SupervisorService:
         if not self.timeout_active:
             return SupervisorTimeout(status="no_timeout_active", active=False)
         
-        if self.shutdown_task:
-            try:
-                self.shutdown_task.cancel()
-                self.shutdown_task = None
-            except:
-                pass
-        
-        # Also check thread timer (for compatibility)
-        if hasattr(self, 'shutdown_timer') and self.shutdown_timer:
-            self.shutdown_timer.cancel()
-            self.shutdown_timer = None
+        if self.shutdown_handle:
+            self.shutdown_handle.cancel()
+            self.shutdown_handle = None
         
         self.timeout_active = False
         self.shutdown_time = None
+        self._shutdown_monotonic = None
         # Re-enable auto-expand when timeout is cancelled
         self._auto_expand_enabled = True
         
@@ -267,9 +397,8 @@ class SupervisorService:
             return SupervisorTimeout(active=False)
         
         remaining_seconds = 0
-        if self.shutdown_time:
-            remaining = self.shutdown_time - datetime.now()
-            remaining_seconds = max(0, remaining.total_seconds())
+        if self._shutdown_monotonic is not None:
+            remaining_seconds = max(0.0, self._shutdown_monotonic - time.monotonic())
         
         return SupervisorTimeout(
             active=self.timeout_active,
@@ -290,20 +419,23 @@ def get_supervisor_service() -> SupervisorService:
     return _supervisor_service
 
 
-# For backward compatibility with existing imports
-# This allows existing code to use: from app.services.supervisor import supervisor_service
-@property
-def supervisor_service():
-    """Property for backward compatibility"""
-    return get_supervisor_service()
-
-
-# Create a module-level attribute that acts like the old global instance
-# but uses lazy initialization
-class _SupervisorServiceProxy:
-    """Proxy that lazily initializes the supervisor service"""
-    def __getattr__(self, name):
-        return getattr(get_supervisor_service(), name)
+def close_supervisor_service():
+    """Close the supervisor service instance if it was created"""
+    global _supervisor_service
+    if _supervisor_service is not None:
+        _supervisor_service.close()
+        _supervisor_service = None
+    # Drop the bound attribute so the next access goes through __getattr__ again
+    globals().pop("supervisor_service", None)
 
 
-supervisor_service = _SupervisorServiceProxy() 
\ No newline at end of file
+def __getattr__(name):
+    """
+    Lazily create the module-level supervisor_service on first access (PEP 562).
+    The instance is then bound as a plain module attribute, so later lookups skip this hook.
+    """
+    if name == "supervisor_service":
+        service = get_supervisor_service()
+        globals()["supervisor_service"] = service
+        return service
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")